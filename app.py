@@ -2,16 +2,26 @@
 Flask Application - Dream Journal Emotion Tracker
 Main application with API endpoints
 """
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, send_file
 from flask_cors import CORS
+from flask_caching import Cache
+from sqlalchemy import func, inspect, text
+from sqlalchemy.orm import load_only
 from datetime import datetime, timedelta
-from models import db, DreamEntry, EmotionSummary
+from models import db, DreamEntry, EmotionSummary, EntryTag, ThemeOccurrence
 from nlp_analyzer import DreamAnalyzer
 from config import Config
-import json
-import io
+import orjson
+import numpy as np
+import tempfile
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape
 from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Preformatted, Spacer
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -19,28 +29,87 @@ app.config.from_object(Config)
 # Initialize extensions
 db.init_app(app)
 CORS(app)
+cache = Cache(app)
 
 # Initialize NLP analyzer
 analyzer = DreamAnalyzer()
 
+# Summaries are generated off the request thread
+summary_executor = ThreadPoolExecutor(max_workers=1)
+# Futures for summaries this process has queued or is building, keyed by summary id
+summary_tasks = {}
+_summary_heartbeat = None
+_summary_heartbeat_lock = threading.Lock()
+
+
+def _backfill_occurrences():
+    """Populate occurrence rows for entries analyzed before the table existed (one-time migration)"""
+    entries = DreamEntry.query.filter(~DreamEntry.occurrences.any()).all()
+    for entry in entries:
+        entry.set_occurrences(
+            entry.themes or [],
+            entry.entities or {}
+        )
+    if entries:
+        db.session.commit()
+
+
+def _backfill_tags():
+    """Populate tag rows for entries tagged before the table existed (one-time migration)"""
+    entries = DreamEntry.query.filter(
+        DreamEntry.tags.isnot(None), ~DreamEntry.tag_rows.any()
+    ).all()
+    for entry in entries:
+        entry.set_tags_list(entry.get_tags_list())
+    if entries:
+        db.session.commit()
+
+
+def _add_summary_heartbeat_column():
+    """Add heartbeat_at to a summaries table created before it existed (one-time migration)"""
+    columns = {column['name'] for column in inspect(db.engine).get_columns('emotion_summaries')}
+    if 'heartbeat_at' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE emotion_summaries ADD COLUMN heartbeat_at DATETIME'))
+
+
 # Create database tables
 with app.app_context():
+    # Tables present before create_all; only newly created ones need backfilling
+    existing_tables = set(inspect(db.engine).get_table_names())
     db.create_all()
+    if 'emotion_summaries' in existing_tables:
+        _add_summary_heartbeat_column()
+    if 'theme_occurrences' not in existing_tables:
+        _backfill_occurrences()
+    if 'entry_tags' not in existing_tables:
+        _backfill_tags()
+    # Close startup connections so none are carried into forked Gunicorn workers
+    db.session.remove()
+    db.engine.dispose()
 
 
 # ============= API ENDPOINTS =============
 
+_index_html = None
+
+
 @app.route('/')
 def index():
-    """Main dashboard page"""
-    return render_template('index.html')
+    """Main dashboard page (rendered once; the template has no per-request data)"""
+    global _index_html
+    if _index_html is None or app.debug:
+        _index_html = render_template('index.html')
+    return Response(_index_html, mimetype='text/html',
+                    headers={'Cache-Control': 'public, max-age=300'})
 
 
 @app.route('/api/entries', methods=['GET'])
 def get_entries():
-    """Get all dream entries with optional filtering"""
+    """Get all dream entries with optional filtering (compact unless ?full=true)"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', Config.ENTRIES_PER_PAGE, type=int)
+    full = request.args.get('full', 'false').lower() == 'true'
     
     # Optional filters
     start_date = request.args.get('start_date')
@@ -48,6 +117,12 @@ def get_entries():
     tag = request.args.get('tag')
     
     query = DreamEntry.query.order_by(DreamEntry.dream_date.desc())
+    if not full:
+        query = query.options(load_only(
+            DreamEntry.id, DreamEntry.title, DreamEntry.content_head, DreamEntry.dream_date,
+            DreamEntry.tags, DreamEntry.sentiment_score, DreamEntry.emotions,
+            DreamEntry.dream_intensity, DreamEntry.stress_level
+        ))
     
     # Apply filters
     if start_date:
@@ -55,12 +130,12 @@ def get_entries():
     if end_date:
         query = query.filter(DreamEntry.dream_date <= datetime.fromisoformat(end_date))
     if tag:
-        query = query.filter(DreamEntry.tags.like(f'%{tag}%'))
+        query = query.join(DreamEntry.tag_rows).filter(EntryTag.tag == tag)
     
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    return jsonify({
-        'entries': [entry.to_dict() for entry in pagination.items],
+    return _json({
+        'entries': [entry.to_dict() if full else entry.to_summary_dict() for entry in pagination.items],
         'total': pagination.total,
         'pages': pagination.pages,
         'current_page': page
@@ -71,7 +146,7 @@ def get_entries():
 def get_entry(entry_id):
     """Get a specific dream entry"""
     entry = DreamEntry.query.get_or_404(entry_id)
-    return jsonify(entry.to_dict())
+    return _json(entry.to_dict())
 
 
 @app.route('/api/entries', methods=['POST'])
@@ -80,33 +155,42 @@ def create_entry():
     data = request.get_json()
     
     if not data or not data.get('content'):
-        return jsonify({'error': 'Content is required'}), 400
+        return _json({'error': 'Content is required'}), 400
     
     # Create new entry
-    entry = DreamEntry(
-        title=data.get('title'),
-        content=data.get('content'),
-        dream_date=datetime.fromisoformat(data.get('dream_date')) if data.get('dream_date') else datetime.now(),
-        tags=','.join(data.get('tags', [])) if isinstance(data.get('tags'), list) else data.get('tags'),
-        sleep_quality=data.get('sleep_quality')
-    )
+    entry = _entry_from_data(data)
     
-    # Perform NLP analysis
-    analysis = analyzer.analyze_dream(entry.content)
-    
-    # Store analysis results
-    entry.sentiment_score = analysis['sentiment_score']
-    entry.emotions = json.dumps(analysis['emotions'])
-    entry.entities = json.dumps(analysis['entities'])
-    entry.themes = json.dumps(analysis['themes'])
-    entry.dream_intensity = analysis['dream_intensity']
-    entry.stress_level = analysis['stress_level']
+    # Perform NLP analysis and store the results
+    _apply_analysis(entry, analyzer.analyze_dream(entry.content))
     
     # Save to database
     db.session.add(entry)
     db.session.commit()
     
-    return jsonify(entry.to_dict()), 201
+    return _json(entry.to_dict()), 201
+
+
+@app.route('/api/entries/bulk', methods=['POST'])
+def create_entries_bulk():
+    """Create several dream entries at once, analyzed in a single batch"""
+    data = request.get_json()
+    items = data.get('entries') if isinstance(data, dict) else data
+    
+    if not items or not isinstance(items, list):
+        return _json({'error': 'A list of entries is required'}), 400
+    if not all(isinstance(item, dict) and item.get('content') for item in items):
+        return _json({'error': 'Content is required for every entry'}), 400
+    
+    entries = [_entry_from_data(item) for item in items]
+    analyses = analyzer.analyze_dreams_batch([entry.content for entry in entries])
+    for entry, analysis in zip(entries, analyses):
+        _apply_analysis(entry, analysis)
+    
+    # Save everything in one transaction
+    db.session.add_all(entries)
+    db.session.commit()
+    
+    return _json([entry.to_dict() for entry in entries]), 201
 
 
 @app.route('/api/entries/<int:entry_id>', methods=['PUT'])
@@ -116,7 +200,7 @@ def update_entry(entry_id):
     data = request.get_json()
     
     if not data:
-        return jsonify({'error': 'No data provided'}), 400
+        return _json({'error': 'No data provided'}), 400
     
     # Update fields
     if 'title' in data:
@@ -124,25 +208,19 @@ def update_entry(entry_id):
     if 'content' in data:
         entry.content = data['content']
         # Re-analyze if content changed
-        analysis = analyzer.analyze_dream(entry.content)
-        entry.sentiment_score = analysis['sentiment_score']
-        entry.emotions = json.dumps(analysis['emotions'])
-        entry.entities = json.dumps(analysis['entities'])
-        entry.themes = json.dumps(analysis['themes'])
-        entry.dream_intensity = analysis['dream_intensity']
-        entry.stress_level = analysis['stress_level']
+        _apply_analysis(entry, analyzer.analyze_dream(entry.content))
     
     if 'dream_date' in data:
         entry.dream_date = datetime.fromisoformat(data['dream_date'])
     if 'tags' in data:
-        entry.tags = ','.join(data['tags']) if isinstance(data['tags'], list) else data['tags']
+        entry.set_tags_list(_parse_tags(data['tags']))
     if 'sleep_quality' in data:
         entry.sleep_quality = data['sleep_quality']
     
     entry.updated_at = datetime.utcnow()
     db.session.commit()
     
-    return jsonify(entry.to_dict())
+    return _json(entry.to_dict())
 
 
 @app.route('/api/entries/<int:entry_id>', methods=['DELETE'])
@@ -152,46 +230,59 @@ def delete_entry(entry_id):
     db.session.delete(entry)
     db.session.commit()
     
-    return jsonify({'message': 'Entry deleted successfully'})
+    return _json({'message': 'Entry deleted successfully'})
 
 
 @app.route('/api/analytics/overview', methods=['GET'])
 def get_analytics_overview():
     """Get overview analytics for dashboard"""
     days = request.args.get('days', 30, type=int)
+    return _json(_overview_data(days, _journal_rev()))
+
+
+@cache.memoize()
+def _overview_data(days, rev):
+    """Get overview analytics for dashboard (cached per journal revision)"""
     start_date = datetime.now() - timedelta(days=days)
     
-    entries = DreamEntry.query.filter(
-        DreamEntry.dream_date >= start_date
-    ).order_by(DreamEntry.dream_date).all()
+    window = DreamEntry.dream_date >= start_date
+    
+    # Counts and averages are computed by the database
+    total_entries, avg_sentiment = db.session.query(
+        func.count(DreamEntry.id),
+        func.avg(DreamEntry.sentiment_score)
+    ).filter(window).one()
     
-    if not entries:
-        return jsonify({
+    if not total_entries:
+        return {
             'total_entries': 0,
             'avg_sentiment': 0,
             'dominant_emotion': 'none',
             'stress_trend': 'no data'
-        })
+        }
     
-    # Calculate statistics
-    total_entries = len(entries)
-    avg_sentiment = sum(e.sentiment_score for e in entries if e.sentiment_score) / total_entries
+    avg_sentiment = avg_sentiment or 0
     
-    # Emotion distribution
+    # Emotion distribution (only the emotions column is loaded)
     emotion_totals = {}
-    for entry in entries:
-        if entry.emotions:
-            emotions = json.loads(entry.emotions)
+    for (emotions,) in db.session.query(DreamEntry.emotions).filter(window):
+        if emotions:
             for emotion, score in emotions.items():
                 emotion_totals[emotion] = emotion_totals.get(emotion, 0) + score
     
     dominant_emotion = max(emotion_totals.items(), key=lambda x: x[1])[0] if emotion_totals else 'neutral'
     
     # Stress trend
-    stress_levels = [e.stress_level for e in entries if e.stress_level is not None]
+    stress_levels = np.fromiter(
+        (level for (level,) in db.session.query(DreamEntry.stress_level).filter(
+            window, DreamEntry.stress_level.isnot(None)
+        ).order_by(DreamEntry.dream_date)),
+        dtype=np.float64
+    )
+    half = len(stress_levels) // 2
     if len(stress_levels) >= 2:
-        first_half_avg = sum(stress_levels[:len(stress_levels)//2]) / (len(stress_levels)//2)
-        second_half_avg = sum(stress_levels[len(stress_levels)//2:]) / (len(stress_levels) - len(stress_levels)//2)
+        first_half_avg = stress_levels[:half].mean()
+        second_half_avg = stress_levels[half:].mean()
         
         if second_half_avg > first_half_avg * 1.1:
             stress_trend = 'increasing'
@@ -202,7 +293,7 @@ def get_analytics_overview():
     else:
         stress_trend = 'insufficient data'
     
-    return jsonify({
+    return {
         'total_entries': total_entries,
         'avg_sentiment': round(avg_sentiment, 3),
         'dominant_emotion': dominant_emotion,
@@ -211,22 +302,31 @@ def get_analytics_overview():
             'start': start_date.isoformat(),
             'end': datetime.now().isoformat()
         }
-    })
+    }
 
 
 @app.route('/api/analytics/timeline', methods=['GET'])
 def get_timeline_data():
     """Get timeline data for emotion trends"""
     days = request.args.get('days', 30, type=int)
+    return _json(_timeline_data(days, _journal_rev()))
+
+
+@cache.memoize()
+def _timeline_data(days, rev):
+    """Get timeline data for emotion trends (cached per journal revision)"""
     start_date = datetime.now() - timedelta(days=days)
     
-    entries = DreamEntry.query.filter(
+    entries = DreamEntry.query.options(load_only(
+        DreamEntry.dream_date, DreamEntry.sentiment_score, DreamEntry.emotions,
+        DreamEntry.stress_level, DreamEntry.dream_intensity
+    )).filter(
         DreamEntry.dream_date >= start_date
     ).order_by(DreamEntry.dream_date).all()
     
     timeline = []
     for entry in entries:
-        emotions = json.loads(entry.emotions) if entry.emotions else {}
+        emotions = entry.emotions or {}
         timeline.append({
             'date': entry.dream_date.isoformat(),
             'sentiment': entry.sentiment_score,
@@ -235,83 +335,48 @@ def get_timeline_data():
             'intensity': entry.dream_intensity
         })
     
-    return jsonify(timeline)
+    return timeline
 
 
 @app.route('/api/analytics/themes', methods=['GET'])
 def get_theme_analysis():
     """Get recurring themes analysis"""
     days = request.args.get('days', 90, type=int)
+    return _json(_theme_data(days, _journal_rev()))
+
+
+@cache.memoize()
+def _theme_data(days, rev):
+    """Get recurring themes analysis (cached per journal revision)"""
     start_date = datetime.now() - timedelta(days=days)
     
-    entries = DreamEntry.query.filter(
-        DreamEntry.dream_date >= start_date
-    ).all()
-    
-    # Aggregate themes
-    all_themes = []
-    for entry in entries:
-        if entry.themes:
-            all_themes.extend(json.loads(entry.themes))
-    
-    # Count occurrences
-    from collections import Counter
-    theme_counts = Counter(all_themes)
-    
-    return jsonify({
-        'themes': [
-            {'name': theme, 'count': count}
-            for theme, count in theme_counts.most_common(20)
-        ]
-    })
+    return {
+        'themes': _top_occurrences('theme', start_date, 20)
+    }
 
 
 @app.route('/api/analytics/entities', methods=['GET'])
 def get_entity_analysis():
     """Get recurring entities (people, places, symbols)"""
     days = request.args.get('days', 90, type=int)
+    return _json(_entity_data(days, _journal_rev()))
+
+
+@cache.memoize()
+def _entity_data(days, rev):
+    """Get recurring people, places and symbols (cached per journal revision)"""
     start_date = datetime.now() - timedelta(days=days)
     
-    entries = DreamEntry.query.filter(
-        DreamEntry.dream_date >= start_date
-    ).all()
-    
-    # Aggregate entities by category
-    all_entities = {
-        'people': [],
-        'places': [],
-        'symbols': []
+    return {
+        'people': _top_occurrences('people', start_date, 10),
+        'places': _top_occurrences('places', start_date, 10),
+        'symbols': _top_occurrences('symbols', start_date, 15)
     }
-    
-    for entry in entries:
-        if entry.entities:
-            entities = json.loads(entry.entities)
-            all_entities['people'].extend(entities.get('people', []))
-            all_entities['places'].extend(entities.get('places', []))
-            all_entities['symbols'].extend(entities.get('symbols', []))
-    
-    # Count occurrences
-    from collections import Counter
-    
-    return jsonify({
-        'people': [
-            {'name': name, 'count': count}
-            for name, count in Counter(all_entities['people']).most_common(10)
-        ],
-        'places': [
-            {'name': name, 'count': count}
-            for name, count in Counter(all_entities['places']).most_common(10)
-        ],
-        'symbols': [
-            {'name': name, 'count': count}
-            for name, count in Counter(all_entities['symbols']).most_common(15)
-        ]
-    })
 
 
 @app.route('/api/summaries/generate', methods=['POST'])
 def generate_summary():
-    """Generate a period summary (weekly or monthly)"""
+    """Start generating a period summary (weekly or monthly)"""
     data = request.get_json()
     period_type = data.get('period_type', 'weekly')
     
@@ -322,111 +387,114 @@ def generate_summary():
     else:  # monthly
         start_date = end_date - timedelta(days=30)
     
-    # Get entries for the period
-    entries = DreamEntry.query.filter(
-        DreamEntry.dream_date >= start_date,
-        DreamEntry.dream_date <= end_date
-    ).all()
-    
-    if not entries:
-        return jsonify({'error': 'No entries found for this period'}), 404
+    period = (DreamEntry.dream_date >= start_date, DreamEntry.dream_date <= end_date)
+    if not db.session.query(DreamEntry.query.filter(*period).exists()).scalar():
+        return _json({'error': 'No entries found for this period'}), 404
     
-    # Generate insights
-    insights = analyzer.generate_insights(entries)
+    _expire_pending_summaries()
     
-    # Create summary
+    # Create a pending summary; insights are generated in the background
     summary = EmotionSummary(
         period_type=period_type,
         period_start=start_date,
-        period_end=end_date,
-        total_entries=insights['total_entries'],
-        avg_sentiment=insights['avg_sentiment'],
-        dominant_emotion=insights['dominant_emotion'],
-        emotion_distribution=json.dumps(insights['emotion_distribution']),
-        recurring_themes=json.dumps(insights['recurring_themes']),
-        stress_trend=insights['stress_trend'],
-        summary_text=f"During this {period_type} period, you recorded {insights['total_entries']} dreams. "
-                     f"Your dominant emotion was {insights['dominant_emotion']} with an average sentiment of "
-                     f"{insights['avg_sentiment']:.2f}. Stress levels are {insights['stress_trend']}.",
-        recommendations=_generate_recommendations(insights)
+        period_end=end_date
     )
-    
     db.session.add(summary)
     db.session.commit()
     
-    return jsonify(summary.to_dict()), 201
+    summary_tasks[summary.id] = summary_executor.submit(_build_summary, summary.id)
+    _start_summary_heartbeat()
+    
+    return _json({'task_id': summary.id, 'status': 'pending'}), 202
+
+
+@app.route('/api/summaries/<int:summary_id>', methods=['GET'])
+def get_summary(summary_id):
+    """Get a summary, or its status while it is still being generated"""
+    summary = EmotionSummary.query.get_or_404(summary_id)
+    
+    if summary.summary_text is None:
+        if _summary_last_seen(summary) < _summary_cutoff():
+            # The owning worker stopped checking in (it restarted); generate_summary cleans it up
+            return _json({'error': 'Summary generation did not finish'}), 500
+        return _json({'task_id': summary.id, 'status': 'pending'}), 202
+    
+    return _json(summary.to_dict())
 
 
 @app.route('/api/summaries', methods=['GET'])
 def get_summaries():
     """Get all generated summaries"""
-    summaries = EmotionSummary.query.order_by(
+    summaries = EmotionSummary.query.filter(
+        EmotionSummary.summary_text.isnot(None)
+    ).order_by(
         EmotionSummary.period_start.desc()
     ).all()
     
-    return jsonify([summary.to_dict() for summary in summaries])
+    return _json([summary.to_dict() for summary in summaries])
 
 
 @app.route('/api/export/pdf', methods=['POST'])
 def export_pdf():
     """Export dream entries as PDF"""
     if not Config.ENABLE_EXPORT:
-        return jsonify({'error': 'Export feature is disabled'}), 403
+        return _json({'error': 'Export feature is disabled'}), 403
     
     data = request.get_json()
     entry_ids = data.get('entry_ids', [])
     
+    # The PDF only needs these columns; skip the JSON analysis blobs
+    query = DreamEntry.query.options(load_only(
+        DreamEntry.id, DreamEntry.title, DreamEntry.dream_date,
+        DreamEntry.sentiment_score, DreamEntry.content
+    ))
+    
     if not entry_ids:
         # Export all entries
-        entries = DreamEntry.query.order_by(DreamEntry.dream_date.desc()).all()
+        entries = query.order_by(DreamEntry.dream_date.desc()).all()
     else:
-        entries = DreamEntry.query.filter(DreamEntry.id.in_(entry_ids)).all()
-    
-    # Create PDF
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
+        entries = query.filter(DreamEntry.id.in_(entry_ids)).all()
     
-    y_position = height - 50
+    # Create PDF (kept in memory up to 1MB, then spilled to disk)
+    buffer = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    doc = SimpleDocTemplate(buffer, pagesize=letter, leftMargin=50, rightMargin=50,
+                            topMargin=50, bottomMargin=50)
     
-    p.setFont("Helvetica-Bold", 24)
-    p.drawString(50, y_position, "Dream Journal Export")
-    y_position -= 40
+    title_style = ParagraphStyle('ExportTitle', fontName='Helvetica-Bold', fontSize=24, leading=28)
+    heading_style = ParagraphStyle('EntryTitle', fontName='Helvetica-Bold', fontSize=14, leading=18)
+    meta_style = ParagraphStyle('EntryMeta', fontName='Helvetica', fontSize=10, leading=14)
+    body_style = ParagraphStyle('EntryBody', fontName='Helvetica', fontSize=9, leading=13)
     
-    p.setFont("Helvetica", 10)
-    p.drawString(50, y_position, f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-    y_position -= 30
+    story = [
+        Paragraph("Dream Journal Export", title_style),
+        Spacer(1, 12),
+        Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}", meta_style),
+        Spacer(1, 20)
+    ]
     
     for entry in entries:
-        # Check if we need a new page
-        if y_position < 100:
-            p.showPage()
-            y_position = height - 50
-        
         # Entry title
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(50, y_position, entry.title or "Untitled Dream")
-        y_position -= 20
+        story.append(Paragraph(escape(entry.title or "Untitled Dream"), heading_style))
         
         # Date and sentiment
-        p.setFont("Helvetica", 10)
-        p.drawString(50, y_position, f"Date: {entry.dream_date.strftime('%Y-%m-%d')}")
-        p.drawString(300, y_position, f"Sentiment: {entry.sentiment_score:.2f}")
-        y_position -= 20
+        story.append(Paragraph(
+            f"Date: {entry.dream_date.strftime('%Y-%m-%d')}&nbsp;&nbsp;&nbsp;&nbsp;"
+            f"Sentiment: {entry.sentiment_score:.2f}",
+            meta_style
+        ))
+        story.append(Spacer(1, 6))
         
-        # Content (truncate if too long)
-        p.setFont("Helvetica", 9)
-        content_lines = entry.content[:500].split('\n')
-        for line in content_lines[:10]:  # Max 10 lines per entry
-            if y_position < 50:
-                p.showPage()
-                y_position = height - 50
-            p.drawString(50, y_position, line[:100])
-            y_position -= 15
-        
-        y_position -= 20
+        # Content (truncate if too long), wrapped up front so reportlab
+        # doesn't have to measure words for layout
+        content_lines = [
+            wrapped
+            for line in entry.content[:500].split('\n')
+            for wrapped in (textwrap.wrap(line, width=100) or [''])
+        ]
+        story.append(Preformatted('\n'.join(content_lines[:10]), body_style))  # Max 10 lines per entry
+        story.append(Spacer(1, 20))
     
-    p.save()
+    doc.build(story)
     buffer.seek(0)
     
     return send_file(
@@ -440,14 +508,159 @@ def export_pdf():
 @app.route('/api/tags', methods=['GET'])
 def get_all_tags():
     """Get all unique tags used"""
-    entries = DreamEntry.query.all()
-    all_tags = set()
-    
-    for entry in entries:
-        if entry.tags:
-            all_tags.update(tag.strip() for tag in entry.tags.split(','))
+    tags = db.session.query(EntryTag.tag).distinct().order_by(EntryTag.tag)
     
-    return jsonify(sorted(list(all_tags)))
+    return _json([tag for (tag,) in tags])
+
+
+def _journal_rev():
+    """Cheap fingerprint of the journal; changes on every create, update or delete"""
+    return tuple(db.session.query(func.max(DreamEntry.updated_at), func.count(DreamEntry.id)).one())
+
+
+def _json(payload):
+    """Serialize a payload to a JSON response with orjson"""
+    return Response(orjson.dumps(payload), mimetype='application/json')
+
+
+def _entry_from_data(data):
+    """Build a new (unanalyzed) entry from request data"""
+    entry = DreamEntry(
+        title=data.get('title'),
+        content=data.get('content'),
+        dream_date=datetime.fromisoformat(data.get('dream_date')) if data.get('dream_date') else datetime.now(),
+        sleep_quality=data.get('sleep_quality')
+    )
+    entry.set_tags_list(_parse_tags(data.get('tags')))
+    return entry
+
+
+def _parse_tags(value):
+    """Accept tags as a list or a comma-separated string"""
+    if isinstance(value, str):
+        return value.split(',')
+    return value or []
+
+
+def _apply_analysis(entry, analysis):
+    """Store NLP analysis results on an entry"""
+    entry.sentiment_score = analysis['sentiment_score']
+    entry.emotions = analysis['emotions']
+    entry.entities = analysis['entities']
+    entry.themes = analysis['themes']
+    entry.dream_intensity = analysis['dream_intensity']
+    entry.stress_level = analysis['stress_level']
+    entry.set_occurrences(analysis['themes'], analysis['entities'])
+
+
+def _top_occurrences(category, start_date, limit):
+    """Count the most frequent theme/entity names since start_date"""
+    count = func.count(ThemeOccurrence.id)
+    rows = db.session.query(ThemeOccurrence.name, count).join(DreamEntry).filter(
+        ThemeOccurrence.category == category,
+        DreamEntry.dream_date >= start_date
+    ).group_by(ThemeOccurrence.name).order_by(count.desc(), ThemeOccurrence.name).limit(limit).all()
+    
+    return [{'name': name, 'count': n} for name, n in rows]
+
+
+def _summary_cutoff():
+    """Heartbeat time before which a still-pending summary counts as failed"""
+    return datetime.utcnow() - timedelta(seconds=Config.SUMMARY_TIMEOUT)
+
+
+def _summary_last_seen(summary):
+    """Last check-in for a pending summary (rows from before heartbeat_at fall back to created_at)"""
+    return summary.heartbeat_at or summary.created_at
+
+
+def _active_summary_ids():
+    """Ids of summaries still queued or building in this process"""
+    for summary_id, future in list(summary_tasks.items()):
+        if future.done():
+            summary_tasks.pop(summary_id, None)
+    return set(summary_tasks)
+
+
+def _start_summary_heartbeat():
+    """Start this worker's heartbeat thread (once per process, after the fork)"""
+    global _summary_heartbeat
+    with _summary_heartbeat_lock:
+        if _summary_heartbeat is None:
+            _summary_heartbeat = threading.Thread(target=_run_summary_heartbeat, daemon=True)
+            _summary_heartbeat.start()
+
+
+def _run_summary_heartbeat():
+    """Keep heartbeat_at fresh on every summary this process has queued or is building"""
+    while True:
+        active = _active_summary_ids()
+        if active:
+            with app.app_context():
+                try:
+                    EmotionSummary.query.filter(
+                        EmotionSummary.id.in_(active),
+                        EmotionSummary.summary_text.is_(None)
+                    ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+                    db.session.commit()
+                except Exception:
+                    app.logger.exception("Summary heartbeat failed")
+                    db.session.rollback()
+        time.sleep(Config.SUMMARY_HEARTBEAT)
+
+
+def _expire_pending_summaries():
+    """Drop pending summaries whose owning worker stopped checking in (it died mid-build)"""
+    EmotionSummary.query.filter(
+        EmotionSummary.summary_text.is_(None),
+        func.coalesce(EmotionSummary.heartbeat_at, EmotionSummary.created_at) < _summary_cutoff()
+    ).delete(synchronize_session=False)
+
+
+def _build_summary(summary_id):
+    """Fill in a pending summary (runs on summary_executor)"""
+    with app.app_context():
+        summary = db.session.get(EmotionSummary, summary_id)
+        if summary is None:
+            return
+        try:
+            # Get entries for the period (only the columns generate_insights reads)
+            entries = DreamEntry.query.options(load_only(
+                DreamEntry.dream_date, DreamEntry.sentiment_score, DreamEntry.emotions,
+                DreamEntry.themes, DreamEntry.stress_level
+            )).filter(
+                DreamEntry.dream_date >= summary.period_start,
+                DreamEntry.dream_date <= summary.period_end
+            ).all()
+            
+            # Generate insights
+            insights = analyzer.generate_insights(entries)
+            
+            summary.total_entries = insights['total_entries']
+            summary.avg_sentiment = insights['avg_sentiment']
+            summary.dominant_emotion = insights['dominant_emotion']
+            summary.emotion_distribution = insights['emotion_distribution']
+            summary.recurring_themes = insights['recurring_themes']
+            summary.stress_trend = insights['stress_trend']
+            summary.recommendations = _generate_recommendations(insights)
+            # Setting summary_text marks the summary as complete
+            summary.summary_text = (
+                f"During this {summary.period_type} period, you recorded {insights['total_entries']} dreams. "
+                f"Your dominant emotion was {insights['dominant_emotion']} with an average sentiment of "
+                f"{insights['avg_sentiment']:.2f}. Stress levels are {insights['stress_trend']}."
+            )
+            db.session.commit()
+        except Exception:
+            app.logger.exception("Summary generation failed for summary %s", summary_id)
+            db.session.rollback()
+            try:
+                summary = db.session.get(EmotionSummary, summary_id)
+                if summary is not None:
+                    db.session.delete(summary)
+                    db.session.commit()
+            except Exception:
+                app.logger.exception("Could not discard failed summary %s", summary_id)
+                db.session.rollback()
 
 
 def _generate_recommendations(insights):
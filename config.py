@@ -12,12 +12,29 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///dream_journal.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_pre_ping': True}
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        # Summaries are written from a background thread
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {'check_same_thread': False}
     
     # Application settings
     ENTRIES_PER_PAGE = 10
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # Pending summaries whose owning worker has not checked in for this long are treated as failed
+    SUMMARY_TIMEOUT = 120  # seconds
+    SUMMARY_HEARTBEAT = 30  # seconds between check-ins for queued and running summaries
+    
+    # Analytics response cache (keys also include the journal revision)
+    CACHE_TYPE = 'SimpleCache'
+    CACHE_DEFAULT_TIMEOUT = 60
+    
     # NLP settings
+    ANALYSIS_CACHE_SIZE = 2048  # Analysis results kept for repeated content
+    ANALYSIS_BATCH_SIZE = 128  # Texts per spaCy batch when analyzing in bulk
+    ANALYSIS_PROCESSES = int(os.environ.get('ANALYSIS_PROCESSES', 1))  # spaCy worker processes for bulk analysis
+    ANALYSIS_THREADS = 2  # Sentiment workers that overlap with spaCy per request
+    TEXTBLOB_MIN_LENGTH = 200  # Shorter texts are scored with VADER alone
     EMOTION_CATEGORIES = [
         'joy', 'sadness', 'fear', 'anger', 
         'surprise', 'disgust', 'trust', 'anticipation'
@@ -0,0 +1,20 @@
+"""
+Gunicorn configuration for Dream Journal
+Preloads the app so all workers share one copy of the spaCy model
+"""
+import multiprocessing
+
+bind = '127.0.0.1:5000'
+
+# Load app.py (and the NLP models) once in the master; workers fork from it
+preload_app = True
+workers = min(4, multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = 2
+
+
+def post_fork(server, worker):
+    """Drop (without closing) any database connections inherited from the preloading master"""
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -3,10 +3,39 @@ Database models for Dream Journal
 """
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-import json
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import column_property
+from sqlalchemy.types import TypeDecorator
+import sqlite3
+import orjson
 
 db = SQLAlchemy()
 
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL so dashboard reads don't block on entry writes"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
+
+
+class JSONEncoded(TypeDecorator):
+    """JSON value stored as TEXT, decoded once when the row is loaded"""
+    impl = db.Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return orjson.dumps(value).decode() if value is not None else None
+    
+    def process_result_value(self, value, dialect):
+        return orjson.loads(value) if value else None
+
+
 class DreamEntry(db.Model):
     """Model for storing dream journal entries"""
     __tablename__ = 'dream_entries'
@@ -14,24 +43,39 @@ class DreamEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=True)
     content = db.Column(db.Text, nullable=False)
-    dream_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # First 151 characters of content, selected in SQL for list excerpts (one extra to detect truncation)
+    content_head = column_property(func.substr(content, 1, 151), deferred=True)
+    dream_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # User-added metadata
-    tags = db.Column(db.String(500), nullable=True)  # Comma-separated tags
+    tags = db.Column(db.String(500), nullable=True)  # Comma-separated tags (display copy of tag_rows)
     sleep_quality = db.Column(db.Integer, nullable=True)  # 1-10 scale
     
     # Analysis results (stored as JSON)
     sentiment_score = db.Column(db.Float, nullable=True)  # -1 to 1
-    emotions = db.Column(db.Text, nullable=True)  # JSON: emotion scores
-    entities = db.Column(db.Text, nullable=True)  # JSON: people, places, objects
-    themes = db.Column(db.Text, nullable=True)  # JSON: recurring themes
+    emotions = db.Column(JSONEncoded, nullable=True)  # JSON: emotion scores
+    entities = db.Column(JSONEncoded, nullable=True)  # JSON: people, places, objects
+    themes = db.Column(JSONEncoded, nullable=True)  # JSON: recurring themes
     
     # Computed metrics
     dream_intensity = db.Column(db.Float, nullable=True)  # 0-1 scale
     stress_level = db.Column(db.Float, nullable=True)  # 0-1 scale
     
+    # Normalized tags used for filtering
+    tag_rows = db.relationship('EntryTag', backref='entry', lazy=True,
+                               cascade='all, delete-orphan')
+    
+    # Flattened themes/entities used by the analytics aggregates
+    occurrences = db.relationship('ThemeOccurrence', backref='entry', lazy=True,
+                                  cascade='all, delete-orphan')
+    
+    # Date-range filters and newest-first pagination use this index
+    __table_args__ = (
+        db.Index('ix_entries_date_desc', dream_date.desc(), id),
+    )
+    
     def __repr__(self):
         return f'<DreamEntry {self.id}: {self.title or "Untitled"}>'
     
@@ -47,9 +91,24 @@ class DreamEntry(db.Model):
             'tags': self.tags.split(',') if self.tags else [],
             'sleep_quality': self.sleep_quality,
             'sentiment_score': self.sentiment_score,
-            'emotions': json.loads(self.emotions) if self.emotions else {},
-            'entities': json.loads(self.entities) if self.entities else {},
-            'themes': json.loads(self.themes) if self.themes else [],
+            'emotions': self.emotions or {},
+            'entities': self.entities or {},
+            'themes': self.themes or [],
+            'dream_intensity': self.dream_intensity,
+            'stress_level': self.stress_level
+        }
+    
+    def to_summary_dict(self):
+        """Convert to a compact dictionary for list views"""
+        head = self.content_head or ''
+        return {
+            'id': self.id,
+            'title': self.title,
+            'dream_date': self.dream_date.isoformat(),
+            'excerpt': head[:150] + ('...' if len(head) > 150 else ''),
+            'tags': self.get_tags_list(),
+            'sentiment_score': self.sentiment_score,
+            'emotions': self.emotions or {},
             'dream_intensity': self.dream_intensity,
             'stress_level': self.stress_level
         }
@@ -59,8 +118,51 @@ class DreamEntry(db.Model):
         return [tag.strip() for tag in self.tags.split(',') if tag.strip()] if self.tags else []
     
     def set_tags_list(self, tags_list):
-        """Set tags from a list"""
+        """Set tags from a list (each tag truncated to fit EntryTag.tag)"""
+        tags_list = list(dict.fromkeys(tag.strip()[:100].rstrip() for tag in tags_list or [] if tag.strip()))
         self.tags = ','.join(tags_list) if tags_list else None
+        self.tag_rows = [EntryTag(tag=tag) for tag in tags_list]
+    
+    def set_occurrences(self, themes, entities):
+        """Replace theme/entity occurrence rows from analysis results"""
+        occurrences = [ThemeOccurrence(category='theme', name=theme) for theme in themes]
+        for category in ThemeOccurrence.ENTITY_CATEGORIES:
+            occurrences.extend(
+                ThemeOccurrence(category=category, name=name[:100])
+                for name in entities.get(category, [])
+            )
+        self.occurrences = occurrences
+
+
+class EntryTag(db.Model):
+    """Model for one tag attached to a dream entry"""
+    __tablename__ = 'entry_tags'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('dream_entries.id'), nullable=False, index=True)
+    tag = db.Column(db.String(100), nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<EntryTag {self.tag}>'
+
+
+class ThemeOccurrence(db.Model):
+    """Model for one theme or entity mentioned in a dream entry"""
+    __tablename__ = 'theme_occurrences'
+    
+    ENTITY_CATEGORIES = ('people', 'places', 'symbols')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('dream_entries.id'), nullable=False, index=True)
+    category = db.Column(db.String(16), nullable=False)  # 'theme', 'people', 'places', 'symbols'
+    name = db.Column(db.String(100), nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_occurrences_category_name', category, name),
+    )
+    
+    def __repr__(self):
+        return f'<ThemeOccurrence {self.category}: {self.name}>'
 
 
 class EmotionSummary(db.Model):
@@ -69,19 +171,21 @@ class EmotionSummary(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     period_type = db.Column(db.String(20), nullable=False)  # 'weekly', 'monthly'
-    period_start = db.Column(db.DateTime, nullable=False)
+    period_start = db.Column(db.DateTime, nullable=False, index=True)
     period_end = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # Last check-in from the worker that owns a pending summary (any worker may expire a stale one)
+    heartbeat_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
     
     # Summary statistics
     total_entries = db.Column(db.Integer, nullable=False, default=0)
     avg_sentiment = db.Column(db.Float, nullable=True)
     dominant_emotion = db.Column(db.String(50), nullable=True)
-    emotion_distribution = db.Column(db.Text, nullable=True)  # JSON
+    emotion_distribution = db.Column(JSONEncoded, nullable=True)  # JSON
     
     # Insights
-    recurring_themes = db.Column(db.Text, nullable=True)  # JSON
-    common_entities = db.Column(db.Text, nullable=True)  # JSON
+    recurring_themes = db.Column(JSONEncoded, nullable=True)  # JSON
+    common_entities = db.Column(JSONEncoded, nullable=True)  # JSON
     stress_trend = db.Column(db.String(20), nullable=True)  # 'increasing', 'decreasing', 'stable'
     
     # AI-generated insights
@@ -102,9 +206,9 @@ class EmotionSummary(db.Model):
             'total_entries': self.total_entries,
             'avg_sentiment': self.avg_sentiment,
             'dominant_emotion': self.dominant_emotion,
-            'emotion_distribution': json.loads(self.emotion_distribution) if self.emotion_distribution else {},
-            'recurring_themes': json.loads(self.recurring_themes) if self.recurring_themes else [],
-            'common_entities': json.loads(self.common_entities) if self.common_entities else {},
+            'emotion_distribution': self.emotion_distribution or {},
+            'recurring_themes': self.recurring_themes or [],
+            'common_entities': self.common_entities or {},
             'stress_trend': self.stress_trend,
             'summary_text': self.summary_text,
             'recommendations': self.recommendations
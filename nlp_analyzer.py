@@ -3,54 +3,157 @@ NLP Analysis Engine for Dream Journal
 Performs sentiment analysis, emotion detection, entity extraction, and theme identification
 """
 import re
-import json
-from collections import Counter
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import orjson
 from textblob import TextBlob
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import spacy
+import ahocorasick
 from config import Config
 
+# Emotion lexicon (simplified - can be expanded)
+EMOTION_KEYWORDS = {
+    'joy': frozenset(['happy', 'joyful', 'excited', 'delighted', 'cheerful', 'wonderful', 
+                      'amazing', 'love', 'loved', 'beautiful', 'peaceful', 'content']),
+    'sadness': frozenset(['sad', 'unhappy', 'depressed', 'lonely', 'crying', 'tears', 
+                          'grief', 'loss', 'heartbroken', 'miserable', 'gloomy']),
+    'fear': frozenset(['afraid', 'scared', 'terrified', 'anxious', 'worried', 'panic', 
+                       'nightmare', 'horror', 'frightened', 'threatened', 'danger']),
+    'anger': frozenset(['angry', 'mad', 'furious', 'rage', 'frustrated', 'irritated', 
+                        'annoyed', 'hostile', 'aggressive', 'violent']),
+    'surprise': frozenset(['surprised', 'shocked', 'amazed', 'astonished', 'stunned', 
+                           'unexpected', 'sudden', 'startled']),
+    'disgust': frozenset(['disgusted', 'revolted', 'repulsed', 'nasty', 'gross', 
+                          'horrible', 'awful', 'unpleasant']),
+    'trust': frozenset(['trust', 'safe', 'secure', 'comfortable', 'protected', 
+                        'confident', 'reliable']),
+    'anticipation': frozenset(['waiting', 'expecting', 'anticipating', 'looking forward', 
+                               'preparing', 'ready', 'hopeful'])
+}
+EMOTION_NAMES = tuple(EMOTION_KEYWORDS)
+
+# Stress indicators
+STRESS_KEYWORDS = frozenset([
+    'chased', 'running', 'late', 'test', 'exam', 'unprepared', 
+    'falling', 'drowning', 'trapped', 'lost', 'naked', 'public',
+    'teeth falling', 'unable to move', 'paralyzed', 'screaming'
+])
+
+# Common dream themes
+COMMON_THEMES = {
+    'flying': frozenset(['flying', 'floating', 'soaring', 'air']),
+    'falling': frozenset(['falling', 'dropping', 'plunging']),
+    'chase': frozenset(['chased', 'running from', 'pursued', 'escape']),
+    'water': frozenset(['water', 'ocean', 'sea', 'river', 'swimming', 'drowning']),
+    'death': frozenset(['death', 'dying', 'dead', 'funeral']),
+    'school': frozenset(['school', 'class', 'teacher', 'exam', 'test']),
+    'work': frozenset(['work', 'office', 'boss', 'job', 'meeting']),
+    'family': frozenset(['family', 'mother', 'father', 'parent', 'sibling']),
+    'romance': frozenset(['love', 'kiss', 'romantic', 'date', 'partner']),
+    'animals': frozenset(['dog', 'cat', 'animal', 'bird', 'snake']),
+    'travel': frozenset(['travel', 'journey', 'trip', 'destination']),
+    'home': frozenset(['home', 'house', 'room', 'apartment'])
+}
+
+# spaCy entity labels grouped into our entity categories (anything else is 'other')
+ENTITY_CATEGORIES = {
+    'PERSON': 'people',
+    'GPE': 'places',
+    'LOC': 'places',
+    'FAC': 'places',
+    'ORG': 'organizations'
+}
+
+# Models shared by every DreamAnalyzer in the process (loaded on first use)
+_NLP = None
+_VADER = None
+_model_lock = threading.Lock()
+
+
+def _get_nlp():
+    """Load the spaCy pipeline once per process"""
+    global _NLP
+    with _model_lock:
+        if _NLP is None:
+            # Only tagger/attribute_ruler (POS) and ner are used; skip the rest
+            disabled = ["parser", "lemmatizer"]
+            try:
+                _NLP = spacy.load("en_core_web_sm", disable=disabled)
+            except OSError:
+                print("Downloading spacy model...")
+                import subprocess
+                subprocess.run(["python", "-m", "spacy", "download", "en_core_web_sm"])
+                _NLP = spacy.load("en_core_web_sm", disable=disabled)
+        return _NLP
+
+
+def _get_vader():
+    """Create the VADER analyzer once per process"""
+    global _VADER
+    with _model_lock:
+        if _VADER is None:
+            _VADER = SentimentIntensityAnalyzer()
+        return _VADER
+
+
 class DreamAnalyzer:
     """Main NLP analyzer for dream entries"""
     
     def __init__(self):
         """Initialize NLP models and analyzers"""
-        try:
-            self.nlp = spacy.load("en_core_web_sm")
-        except OSError:
-            print("Downloading spacy model...")
-            import subprocess
-            subprocess.run(["python", "-m", "spacy", "download", "en_core_web_sm"])
-            self.nlp = spacy.load("en_core_web_sm")
-        
-        self.vader = SentimentIntensityAnalyzer()
-        
-        # Emotion lexicon (simplified - can be expanded)
-        self.emotion_keywords = {
-            'joy': ['happy', 'joyful', 'excited', 'delighted', 'cheerful', 'wonderful', 
-                    'amazing', 'love', 'loved', 'beautiful', 'peaceful', 'content'],
-            'sadness': ['sad', 'unhappy', 'depressed', 'lonely', 'crying', 'tears', 
-                       'grief', 'loss', 'heartbroken', 'miserable', 'gloomy'],
-            'fear': ['afraid', 'scared', 'terrified', 'anxious', 'worried', 'panic', 
-                    'nightmare', 'horror', 'frightened', 'threatened', 'danger'],
-            'anger': ['angry', 'mad', 'furious', 'rage', 'frustrated', 'irritated', 
-                     'annoyed', 'hostile', 'aggressive', 'violent'],
-            'surprise': ['surprised', 'shocked', 'amazed', 'astonished', 'stunned', 
-                        'unexpected', 'sudden', 'startled'],
-            'disgust': ['disgusted', 'revolted', 'repulsed', 'nasty', 'gross', 
-                       'horrible', 'awful', 'unpleasant'],
-            'trust': ['trust', 'safe', 'secure', 'comfortable', 'protected', 
-                     'confident', 'reliable'],
-            'anticipation': ['waiting', 'expecting', 'anticipating', 'looking forward', 
-                           'preparing', 'ready', 'hopeful']
-        }
+        self.nlp = _get_nlp()
+        self.vader = _get_vader()
         
-        # Stress indicators
-        self.stress_keywords = [
-            'chased', 'running', 'late', 'test', 'exam', 'unprepared', 
-            'falling', 'drowning', 'trapped', 'lost', 'naked', 'public',
-            'teeth falling', 'unable to move', 'paralyzed', 'screaming'
-        ]
+        self.keyword_automaton = self._build_keyword_automaton()
+        
+        # Runs sentiment scoring alongside spaCy in analyze_dream
+        self._pool = ThreadPoolExecutor(max_workers=Config.ANALYSIS_THREADS)
+        
+        # Recent analysis results keyed by content hash (stored serialized so
+        # callers can't mutate the cached copy)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+    
+    def _build_keyword_automaton(self):
+        """
+        Build one Aho-Corasick automaton over every emotion, theme and stress keyword
+        Each keyword maps to the (category, key) groups it counts towards
+        """
+        groups = {}
+        for emotion, keywords in EMOTION_KEYWORDS.items():
+            for keyword in keywords:
+                groups.setdefault(keyword, []).append(('emotion', emotion))
+        for theme, keywords in COMMON_THEMES.items():
+            for keyword in keywords:
+                groups.setdefault(keyword, []).append(('theme', theme))
+        for keyword in STRESS_KEYWORDS:
+            groups.setdefault(keyword, []).append(('stress', None))
+        
+        automaton = ahocorasick.Automaton()
+        for keyword, targets in groups.items():
+            automaton.add_word(keyword, (keyword, tuple(targets)))
+        automaton.make_automaton()
+        return automaton
+    
+    def _match_keywords(self, text_lower):
+        """
+        Scan text once for all keywords, matching whole words only
+        Returns Counter of distinct keywords found per (category, key)
+        """
+        found = set()
+        for end, (keyword, targets) in self.keyword_automaton.iter(text_lower):
+            start = end - len(keyword) + 1
+            if start > 0 and text_lower[start - 1].isalnum():
+                continue
+            if end + 1 < len(text_lower) and text_lower[end + 1].isalnum():
+                continue
+            found.update((target, keyword) for target in targets)
+        
+        return Counter(target for target, _ in found)
     
     def analyze_dream(self, content):
         """
@@ -60,13 +163,79 @@ class DreamAnalyzer:
         if not content or not content.strip():
             return self._empty_analysis()
         
-        # Perform all analyses
-        sentiment = self._analyze_sentiment(content)
-        emotions = self._detect_emotions(content)
-        entities = self._extract_entities(content)
-        themes = self._identify_themes(content)
+        key = self._content_key(content)
+        analysis = self._cache_get(key)
+        if analysis is None:
+            # Score sentiment on the pool while spaCy processes the text here
+            sentiment = self._pool.submit(self._analyze_sentiment, content)
+            doc = self.nlp(content)
+            analysis = self._analyze_doc(content, doc, sentiment.result())
+            self._cache_put(key, analysis)
+        
+        return analysis
+    
+    def analyze_dreams_batch(self, texts, batch_size=None, n_process=None):
+        """
+        Analyze several dream texts at once
+        Runs spaCy over the texts in batches with nlp.pipe; returns one result per text
+        """
+        batch_size = batch_size or Config.ANALYSIS_BATCH_SIZE
+        n_process = n_process or Config.ANALYSIS_PROCESSES
+        results = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = self._empty_analysis()
+            else:
+                results[i] = self._cache_get(self._content_key(text))
+                if results[i] is None:
+                    pending.append(i)
+        
+        # Only texts that weren't cached go through spaCy
+        # Worker processes only pay off once there's enough work to spread out
+        if len(pending) < batch_size * 2:
+            n_process = 1
+        docs = self.nlp.pipe([texts[i] for i in pending], batch_size=batch_size,
+                             n_process=n_process)
+        for i, doc in zip(pending, docs):
+            results[i] = self._analyze_doc(texts[i], doc)
+            self._cache_put(self._content_key(texts[i]), results[i])
+        
+        return results
+    
+    @staticmethod
+    def _content_key(content):
+        """Hash dream content into a compact cache key"""
+        return hashlib.blake2b(content.encode(), digest_size=16).digest()
+    
+    def _cache_get(self, key):
+        """Return a fresh copy of a cached analysis, or None"""
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                return None
+            self._cache.move_to_end(key)
+        return orjson.loads(cached)
+    
+    def _cache_put(self, key, analysis):
+        """Remember an analysis, evicting the least recently used beyond the size cap"""
+        with self._cache_lock:
+            self._cache[key] = orjson.dumps(analysis)
+            if len(self._cache) > Config.ANALYSIS_CACHE_SIZE:
+                self._cache.popitem(last=False)
+    
+    def _analyze_doc(self, content, doc, sentiment=None):
+        """Run every analysis on content using its already-processed spaCy doc"""
+        keyword_hits = self._match_keywords(content.lower())
+        word_count, symbols = self._scan_tokens(doc)
+        
+        if sentiment is None:
+            sentiment = self._analyze_sentiment(content)
+        emotions = self._detect_emotions(word_count, keyword_hits)
+        entities = self._extract_entities(doc, symbols)
+        themes = self._identify_themes(keyword_hits)
         intensity = self._calculate_intensity(content, emotions)
-        stress_level = self._detect_stress(content)
+        stress_level = self._detect_stress(content, keyword_hits, sentiment)
         
         return {
             'sentiment_score': sentiment,
@@ -82,10 +251,18 @@ class DreamAnalyzer:
         Analyze sentiment using VADER and TextBlob
         Returns score from -1 (negative) to 1 (positive)
         """
+        # Too short to carry any sentiment
+        if len(text.strip()) < 3:
+            return 0.0
+        
         # VADER sentiment
         vader_scores = self.vader.polarity_scores(text)
         vader_compound = vader_scores['compound']
         
+        # Short texts: VADER alone is reliable, skip the TextBlob pass
+        if len(text) <= Config.TEXTBLOB_MIN_LENGTH:
+            return round(vader_compound, 3)
+        
         # TextBlob sentiment
         blob = TextBlob(text)
         textblob_polarity = blob.sentiment.polarity
@@ -94,97 +271,73 @@ class DreamAnalyzer:
         sentiment = (vader_compound + textblob_polarity) / 2
         return round(sentiment, 3)
     
-    def _detect_emotions(self, text):
+    def _scan_tokens(self, doc):
+        """
+        Walk the doc's tokens once for the counts other steps need
+        Returns (content word count, dream symbols)
+        """
+        word_count = 0
+        symbols = set()
+        noun_count = 0
+        for token in doc:
+            if token.is_stop or token.is_punct:
+                continue
+            word_count += 1
+            # Common nouns as potential dream symbols (first 10 seen)
+            if noun_count < 10 and token.pos_ == 'NOUN' and len(token.text) > 3:
+                symbols.add(token.text.lower())
+                noun_count += 1
+        
+        return word_count, symbols
+    
+    def _detect_emotions(self, word_count, keyword_hits):
         """
         Detect emotions using keyword matching
         Returns dict of emotion scores
         """
-        text_lower = text.lower()
-        doc = self.nlp(text)
-        word_count = len([token for token in doc if not token.is_stop and not token.is_punct])
-        
         if word_count == 0:
             word_count = 1  # Avoid division by zero
         
-        emotion_scores = {}
-        
-        for emotion, keywords in self.emotion_keywords.items():
-            # Count keyword matches
-            matches = sum(1 for keyword in keywords if keyword in text_lower)
-            # Normalize by word count
-            score = min(matches / (word_count * 0.1), 1.0)  # Cap at 1.0
-            emotion_scores[emotion] = round(score, 3)
+        # Keyword matches per emotion, normalized by word count and capped at 1.0
+        matches = np.fromiter(
+            (keyword_hits[('emotion', emotion)] for emotion in EMOTION_NAMES),
+            dtype=float, count=len(EMOTION_NAMES)
+        )
+        scores = np.round(np.clip(matches / (word_count * 0.1), 0.0, 1.0), 3)
+        emotion_scores = dict(zip(EMOTION_NAMES, scores.tolist()))
         
         return emotion_scores
     
-    def _extract_entities(self, text):
+    def _extract_entities(self, doc, symbols):
         """
         Extract named entities (people, places, objects)
         Returns dict categorized by entity type
         """
-        doc = self.nlp(text)
-        
         entities = {
-            'people': [],
-            'places': [],
-            'organizations': [],
-            'other': []
+            'people': set(),
+            'places': set(),
+            'organizations': set(),
+            'other': set()
         }
         
         for ent in doc.ents:
-            entity_text = ent.text.strip()
-            if ent.label_ == 'PERSON':
-                entities['people'].append(entity_text)
-            elif ent.label_ in ['GPE', 'LOC', 'FAC']:
-                entities['places'].append(entity_text)
-            elif ent.label_ == 'ORG':
-                entities['organizations'].append(entity_text)
-            else:
-                entities['other'].append(entity_text)
-        
-        # Extract common nouns as potential dream symbols
-        nouns = [token.text.lower() for token in doc 
-                if token.pos_ == 'NOUN' and not token.is_stop and len(token.text) > 3]
-        entities['symbols'] = list(set(nouns[:10]))  # Top 10 unique nouns
+            category = ENTITY_CATEGORIES.get(ent.label_, 'other')
+            entities[category].add(ent.text.strip())
         
-        # Remove duplicates
-        for key in entities:
-            entities[key] = list(set(entities[key]))
+        entities = {key: list(values) for key, values in entities.items()}
+        entities['symbols'] = list(symbols)
         
         return entities
     
-    def _identify_themes(self, text):
+    def _identify_themes(self, keyword_hits):
         """
         Identify recurring themes based on content analysis
         Returns list of theme keywords
         """
-        doc = self.nlp(text)
-        
-        # Extract noun chunks as potential themes
-        noun_chunks = [chunk.text.lower() for chunk in doc.noun_chunks]
-        
-        # Common dream themes
-        common_themes = {
-            'flying': ['flying', 'floating', 'soaring', 'air'],
-            'falling': ['falling', 'dropping', 'plunging'],
-            'chase': ['chased', 'running from', 'pursued', 'escape'],
-            'water': ['water', 'ocean', 'sea', 'river', 'swimming', 'drowning'],
-            'death': ['death', 'dying', 'dead', 'funeral'],
-            'school': ['school', 'class', 'teacher', 'exam', 'test'],
-            'work': ['work', 'office', 'boss', 'job', 'meeting'],
-            'family': ['family', 'mother', 'father', 'parent', 'sibling'],
-            'romance': ['love', 'kiss', 'romantic', 'date', 'partner'],
-            'animals': ['dog', 'cat', 'animal', 'bird', 'snake'],
-            'travel': ['travel', 'journey', 'trip', 'destination'],
-            'home': ['home', 'house', 'room', 'apartment']
-        }
-        
-        identified_themes = []
-        text_lower = text.lower()
-        
-        for theme, keywords in common_themes.items():
-            if any(keyword in text_lower for keyword in keywords):
-                identified_themes.append(theme)
+        identified_themes = [
+            theme for theme in COMMON_THEMES
+            if keyword_hits[('theme', theme)]
+        ]
         
         return identified_themes
     
@@ -212,18 +365,17 @@ class DreamAnalyzer:
         
         return round(intensity, 3)
     
-    def _detect_stress(self, text):
+    def _detect_stress(self, text, keyword_hits, sentiment=None):
         """
         Detect stress indicators in dream content
         Returns stress level from 0 to 1
         """
-        text_lower = text.lower()
-        
         # Count stress keywords
-        stress_matches = sum(1 for keyword in self.stress_keywords if keyword in text_lower)
+        stress_matches = keyword_hits[('stress', None)]
         
-        # Check for negative sentiment
-        sentiment = self._analyze_sentiment(text)
+        # Check for negative sentiment (reuse the score analyze_dream already has)
+        if sentiment is None:
+            sentiment = self._analyze_sentiment(text)
         negative_sentiment = max(0, -sentiment)
         
         # Combine factors
@@ -257,30 +409,32 @@ class DreamAnalyzer:
         total = len(entries)
         avg_sentiment = sum(e.sentiment_score for e in entries if e.sentiment_score) / total
         
-        # Aggregate emotions
-        all_emotions = {}
-        for entry in entries:
+        # Aggregate emotions (one row per entry, one column per category)
+        categories = Config.EMOTION_CATEGORIES
+        emotion_matrix = np.zeros((total, len(categories)))
+        has_emotions = False
+        for row, entry in enumerate(entries):
             if entry.emotions:
-                emotions = json.loads(entry.emotions)
-                for emotion, score in emotions.items():
-                    all_emotions[emotion] = all_emotions.get(emotion, 0) + score
+                has_emotions = True
+                emotion_matrix[row] = [entry.emotions.get(emotion, 0) for emotion in categories]
+        emotion_totals = emotion_matrix.sum(axis=0)
         
         # Find dominant emotion
-        dominant_emotion = max(all_emotions.items(), key=lambda x: x[1])[0] if all_emotions else 'neutral'
+        dominant_emotion = categories[int(emotion_totals.argmax())] if has_emotions else 'neutral'
         
         # Normalize emotion distribution
-        emotion_total = sum(all_emotions.values())
+        emotion_total = emotion_totals.sum()
         emotion_distribution = {
-            emotion: round(score / emotion_total, 3) 
-            for emotion, score in all_emotions.items()
+            emotion: round(float(score / emotion_total), 3)
+            for emotion, score in zip(categories, emotion_totals)
         } if emotion_total > 0 else {}
         
         # Aggregate themes
-        all_themes = []
+        theme_counter = Counter()
         for entry in entries:
             if entry.themes:
-                all_themes.extend(json.loads(entry.themes))
-        recurring_themes = [theme for theme, count in Counter(all_themes).most_common(5)]
+                theme_counter.update(entry.themes)
+        recurring_themes = [theme for theme, count in theme_counter.most_common(5)]
         
         # Stress trend analysis
         stress_levels = [e.stress_level for e in entries if e.stress_level is not None]
@@ -4,18 +4,13 @@ Analyzes historical dream data to predict patterns and provide insights
 """
 from datetime import datetime, timedelta
 from collections import Counter
-import json
 import numpy as np
 from models import DreamEntry
-from sklearn.linear_model import LinearRegression
 
 
 class DreamPredictor:
     """Generate predictions and insights from dream data"""
     
-    def __init__(self):
-        self.model = LinearRegression()
-    
     def predict_mood_trend(self, entries, days_ahead=7):
         """
         Predict sentiment trend for the next N days
@@ -24,11 +19,13 @@ class DreamPredictor:
         if len(entries) < 7:
             return None
         
+        entries = self._sorted_by_date(entries)
+        
         # Prepare data
         dates = []
         sentiments = []
         
-        for entry in sorted(entries, key=lambda x: x.dream_date):
+        for entry in entries:
             if entry.sentiment_score is not None:
                 days_from_start = (entry.dream_date - entries[0].dream_date).days
                 dates.append(days_from_start)
@@ -37,21 +34,24 @@ class DreamPredictor:
         if len(dates) < 3:
             return None
         
-        # Fit linear regression
-        X = np.array(dates).reshape(-1, 1)
-        y = np.array(sentiments)
+        # Fit a least-squares line (closed form for a single feature)
+        X = np.asarray(dates, dtype=float)
+        y = np.asarray(sentiments, dtype=float)
         
         try:
-            self.model.fit(X, y)
+            x_dev = X - X.mean()
+            spread = (x_dev ** 2).sum()
+            slope = (x_dev * (y - y.mean())).sum() / spread if spread else 0.0
+            intercept = y.mean() - slope * X.mean()
             
             # Predict future values
             last_day = dates[-1]
             future_days = [last_day + i for i in range(1, days_ahead + 1)]
-            predictions = self.model.predict(np.array(future_days).reshape(-1, 1))
+            predictions = intercept + slope * np.asarray(future_days, dtype=float)
             
             return {
                 'days': future_days,
-                'predictions': [float(p) for p in predictions],
+                'predictions': predictions.tolist(),
                 'trend': 'improving' if predictions[-1] > predictions[0] else 'declining',
                 'confidence': 'low' if len(dates) < 14 else 'medium' if len(dates) < 30 else 'high'
             }
@@ -64,6 +64,8 @@ class DreamPredictor:
         Identify recurring patterns in dreams
         Returns insights about dream patterns
         """
+        # Sort once up front for the helpers that walk entries in date order
+        entries = self._sorted_by_date(entries)
         patterns = {
             'time_of_day': self._analyze_time_patterns(entries),
             'day_of_week': self._analyze_day_patterns(entries),
@@ -74,25 +76,25 @@ class DreamPredictor:
         
         return patterns
     
+    def _sorted_by_date(self, entries):
+        """Return entries in dream_date order, skipping the sort if they already are"""
+        if all(a.dream_date <= b.dream_date for a, b in zip(entries, entries[1:])):
+            return entries
+        return sorted(entries, key=lambda x: x.dream_date)
+    
     def _analyze_time_patterns(self, entries):
         """Analyze if certain times of day correlate with dream types"""
-        morning_dreams = []
-        evening_dreams = []
+        hours, sentiments = self._sentiment_arrays(entries, lambda d: d.hour)
+        morning = hours < 12
         
-        for entry in entries:
-            hour = entry.dream_date.hour
-            
-            if hour < 12:
-                morning_dreams.append(entry.sentiment_score)
-            else:
-                evening_dreams.append(entry.sentiment_score)
-        
-        if morning_dreams and evening_dreams:
+        if morning.any() and not morning.all():
+            morning_avg = float(sentiments[morning].mean())
+            evening_avg = float(sentiments[~morning].mean())
             return {
-                'morning_avg': sum(morning_dreams) / len(morning_dreams),
-                'evening_avg': sum(evening_dreams) / len(evening_dreams),
+                'morning_avg': morning_avg,
+                'evening_avg': evening_avg,
                 'insight': 'Morning dreams tend to be more positive' 
-                    if sum(morning_dreams) / len(morning_dreams) > sum(evening_dreams) / len(evening_dreams)
+                    if morning_avg > evening_avg
                     else 'Evening dreams tend to be more positive'
             }
         
@@ -100,35 +102,39 @@ class DreamPredictor:
     
     def _analyze_day_patterns(self, entries):
         """Analyze dream patterns by day of week"""
-        day_sentiments = {i: [] for i in range(7)}
-        
-        for entry in entries:
-            day = entry.dream_date.weekday()
-            if entry.sentiment_score is not None:
-                day_sentiments[day].append(entry.sentiment_score)
+        days, sentiments = self._sentiment_arrays(entries, lambda d: d.weekday())
         
-        day_averages = {
-            day: sum(scores) / len(scores) if scores else None
-            for day, scores in day_sentiments.items()
-        }
+        # Per-weekday sums and counts in one pass each
+        counts = np.bincount(days, minlength=7)
+        sums = np.bincount(days, weights=sentiments, minlength=7)
         
         # Find best and worst days
-        valid_days = {k: v for k, v in day_averages.items() if v is not None}
-        if not valid_days:
+        valid = counts > 0
+        if not valid.any():
             return None
         
+        averages = np.full(7, np.nan)
+        averages[valid] = sums[valid] / counts[valid]
+        best_day = int(np.nanargmax(averages))
+        worst_day = int(np.nanargmin(averages))
+        
         days_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        best_day = max(valid_days.items(), key=lambda x: x[1])
-        worst_day = min(valid_days.items(), key=lambda x: x[1])
         
         return {
-            'best_day': days_names[best_day[0]],
-            'best_score': best_day[1],
-            'worst_day': days_names[worst_day[0]],
-            'worst_score': worst_day[1],
-            'insight': f"Dreams on {days_names[best_day[0]]} tend to be most positive"
+            'best_day': days_names[best_day],
+            'best_score': float(averages[best_day]),
+            'worst_day': days_names[worst_day],
+            'worst_score': float(averages[worst_day]),
+            'insight': f"Dreams on {days_names[best_day]} tend to be most positive"
         }
     
+    def _sentiment_arrays(self, entries, bucket):
+        """Return (bucket index, sentiment) arrays for entries that have a sentiment score"""
+        scored = [entry for entry in entries if entry.sentiment_score is not None]
+        buckets = np.fromiter((bucket(e.dream_date) for e in scored), dtype=np.intp, count=len(scored))
+        sentiments = np.fromiter((e.sentiment_score for e in scored), dtype=float, count=len(scored))
+        return buckets, sentiments
+    
     def _analyze_emotion_correlations(self, entries):
         """Find correlations between different emotions"""
         # This is simplified - in production, use proper correlation analysis
@@ -136,7 +142,7 @@ class DreamPredictor:
         
         for entry in entries:
             if entry.emotions:
-                emotions = json.loads(entry.emotions)
+                emotions = entry.emotions
                 top_emotions = sorted(emotions.items(), key=lambda x: x[1], reverse=True)[:2]
                 if len(top_emotions) == 2 and top_emotions[1][1] > 0.1:
                     pair = tuple(sorted([top_emotions[0][0], top_emotions[1][0]]))
@@ -192,14 +198,14 @@ class DreamPredictor:
         }
     
     def _analyze_cyclical_themes(self, entries):
-        """Detect if certain themes appear in cycles"""
+        """Detect if certain themes appear in cycles (entries must be sorted by date)"""
         # Track themes over time
         theme_timeline = {}
         
-        for entry in sorted(entries, key=lambda x: x.dream_date):
+        for entry in entries:
             if entry.themes:
-                themes = json.loads(entry.themes)
-                date = entry.dream_date.date()
+                themes = entry.themes
+                date = entry.dream_date.toordinal()
                 
                 for theme in themes:
                     if theme not in theme_timeline:
@@ -211,19 +217,17 @@ class DreamPredictor:
         
         for theme, dates in theme_timeline.items():
             if len(dates) >= 3:
-                # Calculate intervals between occurrences
-                intervals = [(dates[i+1] - dates[i]).days for i in range(len(dates)-1)]
-                if intervals:
-                    avg_interval = sum(intervals) / len(intervals)
-                    
-                    # Check if intervals are relatively consistent
-                    variance = sum((i - avg_interval) ** 2 for i in intervals) / len(intervals)
-                    if variance < avg_interval * 0.5:  # Low variance = cyclical
-                        cyclical_themes.append({
-                            'theme': theme,
-                            'avg_interval_days': round(avg_interval, 1),
-                            'occurrences': len(dates)
-                        })
+                # Calculate intervals (in days) between occurrences
+                intervals = np.diff(np.asarray(dates, dtype=np.int64))
+                avg_interval = float(intervals.mean())
+                
+                # Check if intervals are relatively consistent
+                if intervals.var() < avg_interval * 0.5:  # Low variance = cyclical
+                    cyclical_themes.append({
+                        'theme': theme,
+                        'avg_interval_days': round(avg_interval, 1),
+                        'occurrences': len(dates)
+                    })
         
         if cyclical_themes:
             return {
@@ -248,12 +252,17 @@ class DreamPredictor:
                 ]
             }
         
+        entries = self._sorted_by_date(entries)
         insights = []
         recommendations = []
         
+        # Scores packed once; missing values count as 0
+        sentiments = np.fromiter((e.sentiment_score or 0 for e in entries), dtype=float, count=len(entries))
+        stress = np.fromiter((e.stress_level or 0 for e in entries), dtype=float, count=len(entries))
+        
         # Analyze recent trend
-        recent_entries = sorted(entries, key=lambda x: x.dream_date)[-7:]
-        recent_sentiment = sum(e.sentiment_score for e in recent_entries if e.sentiment_score) / len(recent_entries)
+        recent_sentiments = sentiments[-7:]
+        recent_sentiment = float(recent_sentiments.mean())
         
         if recent_sentiment < -0.3:
             insights.append("Your recent dreams show negative sentiment patterns")
@@ -264,14 +273,14 @@ class DreamPredictor:
             recommendations.append("Continue your current sleep routine")
         
         # Analyze stress levels
-        recent_stress = sum(e.stress_level for e in recent_entries if e.stress_level) / len(recent_entries)
+        recent_stress = float(stress[-7:].mean())
         if recent_stress > 0.6:
             insights.append("High stress indicators detected in your dreams")
             recommendations.append("Practice relaxation exercises before bed")
             recommendations.append("Reduce screen time in the evening")
         
         # Check for recurring nightmares
-        nightmare_count = sum(1 for e in recent_entries if e.sentiment_score and e.sentiment_score < -0.5)
+        nightmare_count = int((recent_sentiments < -0.5).sum())
         if nightmare_count >= 3:
             insights.append(f"You've had {nightmare_count} nightmares in the past week")
             recommendations.append("Consider speaking with a healthcare professional if nightmares persist")
@@ -292,7 +301,7 @@ class DreamPredictor:
             'recommendations': recommendations,
             'stats': {
                 'total_dreams': len(entries),
-                'avg_sentiment': sum(e.sentiment_score for e in entries if e.sentiment_score) / len(entries),
+                'avg_sentiment': float(sentiments.mean()),
                 'dreams_per_week': round(frequency, 1),
                 'recent_stress': round(recent_stress, 2)
             }
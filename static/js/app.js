@@ -295,6 +295,7 @@ async function loadEntries(page = 1) {
         
         let url = `${API_BASE}/entries?page=${page}`;
         if (filterTag) url += `&tag=${filterTag}`;
+        if (searchTerm) url += '&full=true';  // Search needs the full content
         
         const response = await fetch(url).then(r => r.json());
         const entryList = document.getElementById('entries-list');
@@ -344,7 +345,7 @@ function createEntryCard(entry) {
                     <small>${date}</small>
                 </div>
                 <div class="dream-entry-content">
-                    <p>${entry.content.substring(0, 150)}${entry.content.length > 150 ? '...' : ''}</p>
+                    <p>${entry.excerpt ?? entry.content.substring(0, 150) + (entry.content.length > 150 ? '...' : '')}</p>
                     
                     <div class="mb-2">
                         <span class="sentiment-indicator sentiment-${sentiment.class}">
@@ -709,6 +710,8 @@ async function generateSummary(periodType) {
         });
         
         if (response.ok) {
+            const task = await response.json();
+            await waitForSummary(task.task_id);
             showNotification(`${periodType.charAt(0).toUpperCase() + periodType.slice(1)} summary generated!`, 'success');
             loadSummaries();
         } else {
@@ -721,6 +724,21 @@ async function generateSummary(periodType) {
     }
 }
 
+async function waitForSummary(summaryId, maxAttempts = 150) {
+    // Summaries are built in the background; poll until the server reports it done
+    for (let attempt = 0; attempt < maxAttempts; attempt++) {
+        const response = await fetch(`${API_BASE}/summaries/${summaryId}`);
+        if (response.status === 200) {
+            return response.json();
+        }
+        if (response.status !== 202) {
+            throw new Error('Failed to generate summary');
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+    throw new Error('Summary generation timed out');
+}
+
 async function exportPDF() {
     try {
         const response = await fetch(`${API_BASE}/export/pdf`, {
@@ -1,253 +1,378 @@
 """
 Visualization utilities for creating charts and graphs
 """
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
+import plotly.io as pio
+from plotly.colors import get_colorscale
+import numpy as np
+import orjson
 from datetime import datetime, timedelta
 from collections import Counter
-import json
 from config import Config
 
+# Config snapshot; these settings don't change at runtime
+_EMO = tuple(Config.EMOTION_CATEGORIES)
+_COLORS = dict(Config.COLOR_SCHEME)
+_EMO_COLOR_LIST = tuple(_COLORS.get(e, '#888888') for e in _EMO)
 
-def create_emotion_timeline(entries):
-    """Create timeline chart showing emotion trends over time"""
-    if not entries:
-        return None
+# Dashboard template expanded and encoded once; plotly.js needs the full dict,
+# not its name, and orjson splices the pre-encoded Fragment in as-is
+_TEMPLATE = orjson.Fragment(orjson.dumps(pio.templates[Config.DASHBOARD_THEME].to_plotly_json()))
+_YLORRD = get_colorscale('YlOrRd')
+
+# Chart layouts never change between calls, so build them once
+_BASE_LAYOUT = {'template': _TEMPLATE}
+_TIMELINE_LAYOUT = {
+    **_BASE_LAYOUT,
+    'title': {'text': 'Emotion Timeline'},
+    'xaxis': {'anchor': 'y', 'domain': [0.0, 0.94], 'title': {'text': 'Date'}},
+    'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': 'Emotion Score'}},
+    'yaxis2': {'anchor': 'x', 'overlaying': 'y', 'side': 'right',
+               'title': {'text': 'Sentiment Score'}},
+    'hovermode': 'x unified',
+    'height': 500
+}
+_DISTRIBUTION_LAYOUT = {
+    **_BASE_LAYOUT,
+    'title': {'text': 'Emotion Distribution'},
+    'height': 400
+}
+_CALENDAR_LAYOUT = {
+    **_BASE_LAYOUT,
+    'title': {'text': 'Dream Activity Calendar'},
+    'yaxis': {'visible': False},
+    'xaxis': {'title': {'text': 'Date'}},
+    'height': 200
+}
+_STRESS_LAYOUT = {
+    **_BASE_LAYOUT,
+    'title': {'text': 'Stress Level Trend'},
+    'xaxis': {'title': {'text': 'Date'}},
+    'yaxis': {'title': {'text': 'Stress Level'}, 'range': [0, 1]},
+    'height': 400
+}
+_GAUGE_LAYOUT = {**_BASE_LAYOUT, 'height': 300}
+_THEMES_LAYOUT = {
+    **_BASE_LAYOUT,
+    'title': {'text': 'Top Dream Themes'},
+    'xaxis': {'title': {'text': 'Theme'}},
+    'yaxis': {'title': {'text': 'Frequency'}},
+    'height': 400
+}
+
+
+def _figure_json(data, layout):
+    """Serialize a figure spec built from plain dicts (no plotly validation)"""
+    figure = {'data': data, 'layout': layout}
+    return orjson.dumps(figure, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+# Placeholder chart returned whenever there's nothing to plot
+_EMPTY_FIGURE_JSON = _figure_json([], {
+    **_BASE_LAYOUT,
+    'xaxis': {'visible': False},
+    'yaxis': {'visible': False},
+    'annotations': [{'text': 'No data', 'showarrow': False}]
+})
+
+
+# What each chart's builder reads from _collect_chart_data
+_TIMELINE_FIELDS = frozenset({'dates', 'sentiment_scores', 'emotion_scores'})
+_DISTRIBUTION_FIELDS = frozenset({'emotion_scores'})
+_CALENDAR_FIELDS = frozenset({'date_intensity'})
+_STRESS_FIELDS = frozenset({'stress'})
+_WORDCLOUD_FIELDS = frozenset({'word_freq'})
+_THEMES_FIELDS = frozenset({'theme_counts'})
+_ALL_FIELDS = (_TIMELINE_FIELDS | _DISTRIBUTION_FIELDS | _CALENDAR_FIELDS
+               | _STRESS_FIELDS | _WORDCLOUD_FIELDS | _THEMES_FIELDS)
+
+
+def _collect_chart_data(entries, fields=_ALL_FIELDS):
+    """Walk the entries once, gathering only the requested chart fields"""
+    count = len(entries)
+    want_dates = 'dates' in fields
+    want_sentiment = 'sentiment_scores' in fields
+    want_emotions = 'emotion_scores' in fields
+    want_calendar = 'date_intensity' in fields
+    want_stress = 'stress' in fields
+    want_words = 'word_freq' in fields
+    want_themes = 'theme_counts' in fields
     
     dates = []
-    emotions_over_time = {emotion: [] for emotion in Config.EMOTION_CATEGORIES}
-    sentiment_scores = []
+    sentiment_scores = np.zeros(count) if want_sentiment else None
+    # One row per emotion, one column per entry (rows stay contiguous for orjson)
+    emotion_scores = np.zeros((len(_EMO), count)) if want_emotions else None
+    date_intensity = {}
+    stress_dates = []
+    stress_levels = []
+    word_freq = Counter()
+    theme_counts = Counter()
     
-    for entry in entries:
-        dates.append(entry.dream_date)
-        sentiment_scores.append(entry.sentiment_score or 0)
+    for col, entry in enumerate(entries):
+        if want_dates:
+            dates.append(entry.dream_date)
+        
+        if want_sentiment and entry.sentiment_score:
+            sentiment_scores[col] = entry.sentiment_score
         
-        if entry.emotions:
-            emotions = json.loads(entry.emotions)
-            for emotion in Config.EMOTION_CATEGORIES:
-                emotions_over_time[emotion].append(emotions.get(emotion, 0))
-        else:
-            for emotion in Config.EMOTION_CATEGORIES:
-                emotions_over_time[emotion].append(0)
-    
-    # Create figure with secondary y-axis
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-    
-    # Add emotion traces
-    for emotion, scores in emotions_over_time.items():
-        fig.add_trace(
-            go.Scatter(
-                x=dates,
-                y=scores,
-                name=emotion.capitalize(),
-                mode='lines+markers',
-                line=dict(color=Config.COLOR_SCHEME.get(emotion, '#888888')),
-                opacity=0.7
-            ),
-            secondary_y=False
-        )
+        if want_emotions and entry.emotions:
+            emotions = entry.emotions
+            emotion_scores[:, col] = [emotions.get(emotion, 0) for emotion in _EMO]
+        
+        # Calendar: each day's highest intensity
+        if want_calendar:
+            day = entry.dream_date.date()
+            intensity = entry.dream_intensity or 0
+            prev = date_intensity.get(day)
+            if prev is None or intensity > prev:
+                date_intensity[day] = intensity
+        
+        if want_stress and entry.stress_level is not None:
+            stress_dates.append(entry.dream_date)
+            stress_levels.append(entry.stress_level)
+        
+        if want_words and entry.entities:
+            entities = entry.entities
+            word_freq.update(entities.get('symbols', ()))
+            word_freq.update(entities.get('people', ()))
+            word_freq.update(entities.get('places', ()))
+        
+        if want_themes and entry.themes:
+            theme_counts.update(entry.themes)
+    
+    return {
+        'dates': dates,
+        'sentiment_scores': sentiment_scores,
+        'emotion_scores': emotion_scores,
+        'date_intensity': date_intensity,
+        'stress_dates': stress_dates,
+        'stress_levels': stress_levels,
+        'word_freq': word_freq,
+        'theme_counts': theme_counts
+    }
+
+
+def build_all_visualizations(entries):
+    """
+    Build every dashboard chart from a single pass over the entries
+    Returns dict of chart name -> figure JSON (a "No data" figure when a chart is empty)
+    """
+    if not entries:
+        return {
+            'emotion_timeline': _EMPTY_FIGURE_JSON,
+            'emotion_distribution': _EMPTY_FIGURE_JSON,
+            'calendar_heatmap': _EMPTY_FIGURE_JSON,
+            'stress_trend': _EMPTY_FIGURE_JSON,
+            'wordcloud': [],
+            'theme_chart': _EMPTY_FIGURE_JSON,
+            'sentiment_gauge': _EMPTY_FIGURE_JSON
+        }
+    
+    chart_data = _collect_chart_data(entries)
+    
+    return {
+        'emotion_timeline': _emotion_timeline_figure(chart_data),
+        'emotion_distribution': _emotion_distribution_figure(chart_data),
+        'calendar_heatmap': _calendar_heatmap_figure(chart_data),
+        'stress_trend': _stress_trend_figure(chart_data),
+        'wordcloud': _wordcloud_data(chart_data),
+        'theme_chart': _theme_bar_chart_figure(chart_data),
+        'sentiment_gauge': create_sentiment_gauge(float(chart_data['sentiment_scores'].mean()))
+    }
+
+
+def create_emotion_timeline(entries):
+    """Create timeline chart showing emotion trends over time"""
+    if not entries:
+        return _EMPTY_FIGURE_JSON
+    
+    return _emotion_timeline_figure(_collect_chart_data(entries, _TIMELINE_FIELDS))
+
+
+def _emotion_timeline_figure(chart_data):
+    """Build the emotion timeline figure from collected chart data"""
+    dates = chart_data['dates']
+    scores = chart_data['emotion_scores']
+    
+    # Emotion traces on the left axis, sentiment line on the right one
+    data = [
+        {
+            'type': 'scatter',
+            'x': dates,
+            'y': scores[row],
+            'name': emotion.capitalize(),
+            'mode': 'lines+markers',
+            'line': {'color': _EMO_COLOR_LIST[row]},
+            'opacity': 0.7,
+            'xaxis': 'x',
+            'yaxis': 'y'
+        }
+        for row, emotion in enumerate(_EMO)
+    ]
     
     # Add sentiment line
-    fig.add_trace(
-        go.Scatter(
-            x=dates,
-            y=sentiment_scores,
-            name='Overall Sentiment',
-            mode='lines',
-            line=dict(color='black', width=3, dash='dash'),
-        ),
-        secondary_y=True
-    )
-    
-    # Update layout
-    fig.update_layout(
-        title='Emotion Timeline',
-        xaxis_title='Date',
-        hovermode='x unified',
-        template=Config.DASHBOARD_THEME,
-        height=500
-    )
-    
-    fig.update_yaxes(title_text="Emotion Score", secondary_y=False)
-    fig.update_yaxes(title_text="Sentiment Score", secondary_y=True)
-    
-    return fig.to_json()
+    data.append({
+        'type': 'scatter',
+        'x': dates,
+        'y': chart_data['sentiment_scores'],
+        'name': 'Overall Sentiment',
+        'mode': 'lines',
+        'line': {'color': 'black', 'width': 3, 'dash': 'dash'},
+        'xaxis': 'x',
+        'yaxis': 'y2'
+    })
+    
+    return _figure_json(data, _TIMELINE_LAYOUT)
 
 
 def create_emotion_distribution(entries):
     """Create pie chart showing emotion distribution"""
     if not entries:
-        return None
+        return _EMPTY_FIGURE_JSON
     
-    emotion_totals = {emotion: 0 for emotion in Config.EMOTION_CATEGORIES}
-    
-    for entry in entries:
-        if entry.emotions:
-            emotions = json.loads(entry.emotions)
-            for emotion, score in emotions.items():
-                if emotion in emotion_totals:
-                    emotion_totals[emotion] += score
-    
-    # Filter out emotions with zero values
-    emotion_totals = {k: v for k, v in emotion_totals.items() if v > 0}
+    return _emotion_distribution_figure(_collect_chart_data(entries, _DISTRIBUTION_FIELDS))
+
+
+def _emotion_distribution_figure(chart_data):
+    """Build the emotion distribution pie from collected chart data"""
+    totals = chart_data['emotion_scores'].sum(axis=1)
+    
+    # Nonzero emotions, largest first (the order plotly would sort slices into anyway)
+    items = [
+        (emotion, float(total))
+        for emotion, total in zip(_EMO, totals)
+        if total > 0
+    ]
     
-    if not emotion_totals:
-        return None
+    if not items:
+        return _EMPTY_FIGURE_JSON
     
-    fig = go.Figure(data=[go.Pie(
-        labels=[e.capitalize() for e in emotion_totals.keys()],
-        values=list(emotion_totals.values()),
-        marker=dict(colors=[Config.COLOR_SCHEME.get(e, '#888888') for e in emotion_totals.keys()]),
-        hole=0.3
-    )])
+    items.sort(key=lambda item: -item[1])
     
-    fig.update_layout(
-        title='Emotion Distribution',
-        template=Config.DASHBOARD_THEME,
-        height=400
-    )
+    data = [{
+        'type': 'pie',
+        'labels': [e.capitalize() for e, _ in items],
+        'values': [v for _, v in items],
+        'marker': {'colors': [_COLORS.get(e, '#888888') for e, _ in items]},
+        'hole': 0.3
+    }]
     
-    return fig.to_json()
+    return _figure_json(data, _DISTRIBUTION_LAYOUT)
 
 
 def create_calendar_heatmap(entries):
     """Create calendar heatmap showing dream frequency and intensity"""
     if not entries:
-        return None
+        return _EMPTY_FIGURE_JSON
     
-    # Group by date
-    date_intensity = {}
-    for entry in entries:
-        date_str = entry.dream_date.strftime('%Y-%m-%d')
-        intensity = entry.dream_intensity or 0
-        
-        if date_str in date_intensity:
-            date_intensity[date_str] = max(date_intensity[date_str], intensity)
-        else:
-            date_intensity[date_str] = intensity
-    
-    dates = list(date_intensity.keys())
-    intensities = list(date_intensity.values())
-    
-    fig = go.Figure(data=go.Scatter(
-        x=dates,
-        y=[1] * len(dates),
-        mode='markers',
-        marker=dict(
-            size=20,
-            color=intensities,
-            colorscale='YlOrRd',
-            showscale=True,
-            colorbar=dict(title="Intensity"),
-            cmin=0,
-            cmax=1
-        ),
-        text=[f"Date: {d}<br>Intensity: {i:.2f}" for d, i in zip(dates, intensities)],
-        hovertemplate='%{text}<extra></extra>'
-    ))
-    
-    fig.update_layout(
-        title='Dream Activity Calendar',
-        yaxis=dict(visible=False),
-        xaxis_title='Date',
-        template=Config.DASHBOARD_THEME,
-        height=200
-    )
-    
-    return fig.to_json()
+    return _calendar_heatmap_figure(_collect_chart_data(entries, _CALENDAR_FIELDS))
+
+
+def _calendar_heatmap_figure(chart_data):
+    """Build the calendar heatmap from collected chart data"""
+    date_intensity = chart_data['date_intensity']
+    
+    # Format each distinct day once
+    dates = [day.isoformat() for day in date_intensity]
+    intensities = np.fromiter(date_intensity.values(), dtype=float, count=len(date_intensity))
+    
+    data = [{
+        'type': 'scatter',
+        'x': dates,
+        'y': [1] * len(dates),
+        'mode': 'markers',
+        'marker': {
+            'size': 20,
+            'color': intensities,
+            'colorscale': _YLORRD,
+            'showscale': True,
+            'colorbar': {'title': {'text': 'Intensity'}},
+            'cmin': 0,
+            'cmax': 1
+        },
+        # Formatted by plotly.js on hover instead of one string per point here
+        'hovertemplate': 'Date: %{x|%Y-%m-%d}<br>Intensity: %{marker.color:.2f}<extra></extra>'
+    }]
+    
+    return _figure_json(data, _CALENDAR_LAYOUT)
 
 
 def create_stress_trend(entries):
     """Create line chart showing stress level trends"""
     if not entries:
-        return None
+        return _EMPTY_FIGURE_JSON
     
-    dates = []
-    stress_levels = []
+    return _stress_trend_figure(_collect_chart_data(entries, _STRESS_FIELDS))
+
+
+def _stress_trend_figure(chart_data):
+    """Build the stress trend chart from collected chart data"""
+    dates = chart_data['stress_dates']
     
-    for entry in entries:
-        if entry.stress_level is not None:
-            dates.append(entry.dream_date)
-            stress_levels.append(entry.stress_level)
+    if not chart_data['stress_levels']:
+        return _EMPTY_FIGURE_JSON
     
-    if not stress_levels:
-        return None
+    stress_levels = np.asarray(chart_data['stress_levels'], dtype=float)
     
-    # Calculate moving average
+    # Calculate moving average (window sums from a running total)
     window = 7
-    moving_avg = []
-    for i in range(len(stress_levels)):
-        start_idx = max(0, i - window + 1)
-        avg = sum(stress_levels[start_idx:i+1]) / (i - start_idx + 1)
-        moving_avg.append(avg)
-    
-    fig = go.Figure()
-    
-    # Raw stress levels
-    fig.add_trace(go.Scatter(
-        x=dates,
-        y=stress_levels,
-        name='Stress Level',
-        mode='markers',
-        marker=dict(color='rgba(255, 0, 0, 0.5)', size=8)
-    ))
-    
-    # Moving average
-    fig.add_trace(go.Scatter(
-        x=dates,
-        y=moving_avg,
-        name=f'{window}-Day Average',
-        mode='lines',
-        line=dict(color='red', width=2)
-    ))
-    
-    fig.update_layout(
-        title='Stress Level Trend',
-        xaxis_title='Date',
-        yaxis_title='Stress Level',
-        yaxis=dict(range=[0, 1]),
-        template=Config.DASHBOARD_THEME,
-        height=400
-    )
-    
-    return fig.to_json()
+    totals = np.concatenate(([0.0], np.cumsum(stress_levels)))
+    idx = np.arange(len(stress_levels))
+    start = np.maximum(0, idx - window + 1)
+    moving_avg = (totals[idx + 1] - totals[start]) / (idx - start + 1)
+    
+    data = [
+        # Raw stress levels
+        {
+            'type': 'scatter',
+            'x': dates,
+            'y': stress_levels,
+            'name': 'Stress Level',
+            'mode': 'markers',
+            'marker': {'color': 'rgba(255, 0, 0, 0.5)', 'size': 8}
+        },
+        # Moving average
+        {
+            'type': 'scatter',
+            'x': dates,
+            'y': moving_avg,
+            'name': f'{window}-Day Average',
+            'mode': 'lines',
+            'line': {'color': 'red', 'width': 2}
+        }
+    ]
+    
+    return _figure_json(data, _STRESS_LAYOUT)
 
 
 def create_wordcloud_data(entries):
     """Generate word frequency data for word cloud"""
     if not entries:
-        return None
-    
-    # Aggregate all symbols/entities
-    all_words = []
-    
-    for entry in entries:
-        if entry.entities:
-            entities = json.loads(entry.entities)
-            all_words.extend(entities.get('symbols', []))
-            all_words.extend(entities.get('people', []))
-            all_words.extend(entities.get('places', []))
+        return []
     
-    # Count frequencies
-    word_freq = Counter(all_words)
-    
-    # Return top 50 words
+    return _wordcloud_data(_collect_chart_data(entries, _WORDCLOUD_FIELDS))
+
+
+def _wordcloud_data(chart_data):
+    """Return the top 50 symbols/entities from collected chart data"""
     return [
         {'text': word, 'value': count}
-        for word, count in word_freq.most_common(50)
+        for word, count in chart_data['word_freq'].most_common(50)
     ]
 
 
 def create_sentiment_gauge(avg_sentiment):
     """Create gauge chart for overall sentiment"""
-    fig = go.Figure(go.Indicator(
-        mode="gauge+number+delta",
-        value=avg_sentiment,
-        domain={'x': [0, 1], 'y': [0, 1]},
-        title={'text': "Overall Sentiment"},
-        delta={'reference': 0},
-        gauge={
+    if avg_sentiment is None:
+        return _EMPTY_FIGURE_JSON
+    
+    data = [{
+        'type': 'indicator',
+        'mode': "gauge+number+delta",
+        'value': avg_sentiment,
+        'domain': {'x': [0, 1], 'y': [0, 1]},
+        'title': {'text': "Overall Sentiment"},
+        'delta': {'reference': 0},
+        'gauge': {
             'axis': {'range': [-1, 1]},
             'bar': {'color': "darkblue"},
             'steps': [
@@ -261,48 +386,35 @@ def create_sentiment_gauge(avg_sentiment):
                 'value': 0
             }
         }
-    ))
-    
-    fig.update_layout(
-        template=Config.DASHBOARD_THEME,
-        height=300
-    )
+    }]
     
-    return fig.to_json()
+    return _figure_json(data, _GAUGE_LAYOUT)
 
 
 def create_theme_bar_chart(entries):
     """Create bar chart of recurring themes"""
     if not entries:
-        return None
+        return _EMPTY_FIGURE_JSON
     
-    all_themes = []
-    for entry in entries:
-        if entry.themes:
-            all_themes.extend(json.loads(entry.themes))
+    return _theme_bar_chart_figure(_collect_chart_data(entries, _THEMES_FIELDS))
+
+
+def _theme_bar_chart_figure(chart_data):
+    """Build the top themes bar chart from collected chart data"""
+    theme_counts = chart_data['theme_counts']
     
-    if not all_themes:
-        return None
+    if not theme_counts:
+        return _EMPTY_FIGURE_JSON
     
-    theme_counts = Counter(all_themes)
     top_themes = theme_counts.most_common(10)
     
     themes, counts = zip(*top_themes) if top_themes else ([], [])
     
-    fig = go.Figure(data=[
-        go.Bar(
-            x=list(themes),
-            y=list(counts),
-            marker_color='indianred'
-        )
-    ])
-    
-    fig.update_layout(
-        title='Top Dream Themes',
-        xaxis_title='Theme',
-        yaxis_title='Frequency',
-        template=Config.DASHBOARD_THEME,
-        height=400
-    )
-    
-    return fig.to_json()
+    data = [{
+        'type': 'bar',
+        'x': list(themes),
+        'y': list(counts),
+        'marker': {'color': 'indianred'}
+    }]
+    
+    return _figure_json(data, _THEMES_LAYOUT)